@@ -0,0 +1,38 @@
+"""Add an index for looking up remote checkpoints by path.
+
+Revision ID: 4b1e6a3c9d02
+Revises: 2d46c89138b0
+Create Date: 2026-10-16 09:12:41.508216
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4b1e6a3c9d02'
+down_revision = '2d46c89138b0'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+
+    # Every remote_checkpoints query filters on (user_id, path), and listing
+    # checkpoints orders by last_modified.  Postgres can scan this index
+    # backwards to produce the newest-first ordering without a sort.
+    op.create_index(
+        'ix_remote_checkpoints_user_id_path_last_modified',
+        'remote_checkpoints',
+        ['user_id', 'path', 'last_modified'],
+        schema='pgcontents',
+    )
+
+
+def downgrade():
+
+    op.drop_index(
+        'ix_remote_checkpoints_user_id_path_last_modified',
+        'remote_checkpoints',
+        schema='pgcontents',
+    )
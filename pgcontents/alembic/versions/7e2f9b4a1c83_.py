@@ -0,0 +1,39 @@
+"""Add a pattern-matching index on remote checkpoint paths.
+
+Revision ID: 7e2f9b4a1c83
+Revises: 4b1e6a3c9d02
+Create Date: 2026-10-16 09:48:05.913470
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7e2f9b4a1c83'
+down_revision = '4b1e6a3c9d02'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+
+    # Moving a directory's checkpoints matches paths with LIKE 'prefix%'.
+    # Unless the database uses the C collation, Postgres can only use an
+    # index for that if it's built with text_pattern_ops.
+    op.create_index(
+        'ix_remote_checkpoints_user_id_path_pattern',
+        'remote_checkpoints',
+        ['user_id', 'path'],
+        schema='pgcontents',
+        postgresql_ops={'path': 'text_pattern_ops'},
+    )
+
+
+def downgrade():
+
+    op.drop_index(
+        'ix_remote_checkpoints_user_id_path_pattern',
+        'remote_checkpoints',
+        schema='pgcontents',
+    )
@@ -0,0 +1,36 @@
+"""Index directories by parent for subdirectory listings.
+
+Revision ID: 9a4c6e2b8d17
+Revises: e5a7c2d9f1b3
+Create Date: 2026-10-16 14:12:08.533904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9a4c6e2b8d17'
+down_revision = 'e5a7c2d9f1b3'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+def upgrade():
+
+    # Listing a directory's children filters on (user_id, parent_name).
+    # Including name lets the listing be read in order from the index alone.
+    op.create_index(
+        'ix_directories_user_id_parent_name_name',
+        'directories',
+        ['user_id', 'parent_name', 'name'],
+        schema='pgcontents',
+    )
+
+
+def downgrade():
+
+    op.drop_index(
+        'ix_directories_user_id_parent_name_name',
+        'directories',
+        schema='pgcontents',
+    )
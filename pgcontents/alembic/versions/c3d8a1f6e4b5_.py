@@ -0,0 +1,48 @@
+"""Cover remote checkpoint listings with the (user_id, path) index.
+
+Revision ID: c3d8a1f6e4b5
+Revises: 7e2f9b4a1c83
+Create Date: 2026-10-16 11:27:53.204118
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8a1f6e4b5'
+down_revision = '7e2f9b4a1c83'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+
+    # Listing checkpoints only reads id and last_modified.  Adding id to the
+    # index lets Postgres answer the listing from the index alone.
+    op.drop_index(
+        'ix_remote_checkpoints_user_id_path_last_modified',
+        'remote_checkpoints',
+        schema='pgcontents',
+    )
+    op.create_index(
+        'ix_remote_checkpoints_user_id_path_last_modified_id',
+        'remote_checkpoints',
+        ['user_id', 'path', 'last_modified', 'id'],
+        schema='pgcontents',
+    )
+
+
+def downgrade():
+
+    op.drop_index(
+        'ix_remote_checkpoints_user_id_path_last_modified_id',
+        'remote_checkpoints',
+        schema='pgcontents',
+    )
+    op.create_index(
+        'ix_remote_checkpoints_user_id_path_last_modified',
+        'remote_checkpoints',
+        ['user_id', 'path', 'last_modified'],
+        schema='pgcontents',
+    )
@@ -0,0 +1,49 @@
+"""Count directory slashes without regexp_replace.
+
+Revision ID: e5a7c2d9f1b3
+Revises: c3d8a1f6e4b5
+Create Date: 2026-10-16 13:04:41.781250
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c2d9f1b3'
+down_revision = 'c3d8a1f6e4b5'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+def upgrade():
+
+    # Same invariant as before, but replace() is much cheaper than
+    # regexp_replace() on every insert and rename.
+    op.drop_constraint(
+        u'directories_slash_count',
+        'directories',
+        schema='pgcontents',
+    )
+    op.create_check_constraint(
+        u'directories_slash_count',
+        'directories',
+        "length(name) - length(replace(name, '/', '')) - 1"
+        " = length(parent_name) - length(replace(parent_name, '/', ''))",
+        schema='pgcontents',
+    )
+
+
+def downgrade():
+
+    op.drop_constraint(
+        u'directories_slash_count',
+        'directories',
+        schema='pgcontents',
+    )
+    op.create_check_constraint(
+        u'directories_slash_count',
+        'directories',
+        "length(regexp_replace(name, '[^/]+', '', 'g')) - 1"
+        "= length(regexp_replace(parent_name, '[^/]+', '', 'g'))",
+        schema='pgcontents',
+    )
@@ -22,9 +22,35 @@ NBFORMAT_VERSION = 4
 DUMMY_CREATED_DATE = datetime.fromtimestamp(0)
 
 
+# Maximum number of entries held by each memoized path conversion function.
+PATH_MEMO_SIZE = 4096
+
+
+def memoize_path_conversion(f):
+    """
+    Decorator memoizing a pure function of a single path.
+
+    The memo is cleared whenever it grows past ``PATH_MEMO_SIZE`` entries, so
+    memory use stays bounded.  Exceptions are not memoized.
+    """
+    memo = {}
+
+    @wraps(f)
+    def memoized_f(path):
+        try:
+            return memo[path]
+        except KeyError:
+            result = f(path)
+            if len(memo) >= PATH_MEMO_SIZE:
+                memo.clear()
+            memo[path] = result
+            return result
+    return memoized_f
+
+
 def base_model(path):
     return {
-        "name": path.rsplit('/', 1)[-1],
+        "name": path.rpartition('/')[2],
         "path": path,
         "writable": True,
         "last_modified": None,
@@ -65,6 +91,7 @@ def normalize_api_path(api_path):
     return normalized
 
 
+@memoize_path_conversion
 def from_api_dirname(api_dirname):
     """
     Convert API-style directory name into a db-style directory name.
@@ -75,6 +102,7 @@ def from_api_dirname(api_dirname):
     return '/' + normalized + '/'
 
 
+@memoize_path_conversion
 def from_api_filename(api_path):
     """
     Convert an API-style path into a db-style path.
@@ -91,18 +119,14 @@ def to_api_path(db_path):
     return db_path.strip('/')
 
 
+@memoize_path_conversion
 def split_api_filepath(path):
     """
     Split an API file path into directory and name.
     """
-    parts = path.rsplit('/', 1)
-    if len(parts) == 1:
-        name = parts[0]
-        dirname = '/'
-    else:
-        name = parts[1]
-        dirname = parts[0] + '/'
-
+    # rpartition returns an empty dirname for paths without a '/', which
+    # from_api_dirname maps to the root directory.
+    dirname, _, name = path.rpartition('/')
     return from_api_dirname(dirname), name
 
 
@@ -123,6 +147,16 @@ def reads_base64(nb, as_version=NBFORMAT_VERSION):
         raise CorruptedFile(e)
 
 
+def reads_base64_json(nb):
+    """
+    Read a notebook's JSON from base64, without parsing it.
+    """
+    try:
+        return b64decode(nb)
+    except Exception as e:
+        raise CorruptedFile(e)
+
+
 def _decode_text_from_base64(path, bcontent):
     content = b64decode(bcontent)
     try:
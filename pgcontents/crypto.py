@@ -7,6 +7,7 @@ encounter an input that they cannot decrypt.
 """
 import sys
 import base64
+import zlib
 from functools import wraps
 
 from cryptography.fernet import Fernet
@@ -14,7 +15,7 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
-from .error import CorruptedFile
+from .error import CorruptedFile, FileTooLarge
 
 if sys.version_info.major == 3:
     unicode = str
@@ -141,6 +142,110 @@ class FallbackCrypto(object):
         raise CorruptedFile(errors)
 
 
+class ZlibCompression(object):
+    """
+    Crypto wrapper that zlib-compresses content before handing it to another
+    crypto for encryption.
+
+    Notebook JSON is highly compressible, but encrypted data isn't, so
+    compression has to happen before encryption to be of any use.  Inputs
+    smaller than ``min_size`` bytes are passed through uncompressed.
+
+    Parameters
+    ----------
+    crypto : object
+        Crypto to use for encryption after compression and for decryption
+        before decompression.
+    max_size : int
+        Largest uncompressed input, in bytes, that will be stored or
+        returned.  This should usually be the manager's
+        ``max_file_size_bytes``.
+    min_size : int, optional
+        Inputs shorter than this many bytes are not compressed.
+    level : int, optional
+        Compression level to pass to ``zlib.compress``.
+
+    Methods
+    -------
+    encrypt : callable[bytes -> bytes]
+    decrypt : callable[bytes -> bytes]
+
+    Notes
+    -----
+    Compressed payloads are tagged with a prefix starting with a NUL byte.
+    PostgresContentsManager only ever stores base64 text, which can't
+    contain NUL, so content written before compression was enabled (or
+    below ``min_size``) is passed through unchanged.  Stored content that
+    does start with the prefix is always treated as compressed, and raises
+    CorruptedFile if it isn't a valid zlib stream.
+
+    ``max_file_size_bytes`` is checked against the encrypted output, which
+    is smaller than the input once compressed.  ``max_size`` bounds the
+    uncompressed size instead: encrypt raises FileTooLarge for larger
+    inputs, and decrypt raises CorruptedFile rather than inflating a
+    payload past it.
+    """
+    __slots__ = ('_crypto', '_max_size', '_min_size', '_level')
+
+    _prefix = b'\x00zlib:'
+
+    def __init__(self, crypto, max_size, min_size=4096, level=6):
+        if max_size <= 0:
+            raise ValueError(
+                "ZlibCompression requires a positive max_size, got %r."
+                % max_size
+            )
+        self._crypto = crypto
+        self._max_size = max_size
+        self._min_size = min_size
+        self._level = level
+
+    def encrypt(self, s):
+        if len(s) > self._max_size:
+            raise FileTooLarge()
+        if len(s) >= self._min_size:
+            s = self._prefix + zlib.compress(s, self._level)
+        return self._crypto.encrypt(s)
+
+    def decrypt(self, s):
+        s = self._crypto.decrypt(s)
+        if not s.startswith(self._prefix):
+            return s
+
+        decompressor = zlib.decompressobj()
+        try:
+            # Limit the output so that a small payload can't inflate without
+            # bound.  Producing more than max_size bytes, or leaving input
+            # unconsumed, means the content is too large.
+            result = decompressor.decompress(
+                s[len(self._prefix):],
+                self._max_size + 1,
+            )
+        except zlib.error as e:
+            raise CorruptedFile(e)
+        if len(result) > self._max_size or decompressor.unconsumed_tail:
+            raise CorruptedFile(
+                "Decompressed content exceeds %d bytes." % self._max_size
+            )
+        return result
+
+    def _copy(self):
+        return ZlibCompression(
+            self._crypto,
+            self._max_size,
+            self._min_size,
+            self._level,
+        )
+
+    def __copy__(self):
+        return self._copy()
+
+    def __deepcopy__(self, memo):
+        # Wrapped cryptos may not be deepcopy-able (see FernetEncryption), so
+        # share the underlying crypto instead of copying it.
+        return self._copy()
+
+
 def ascii_unicode_to_bytes(v):
     assert isinstance(v, unicode), "Expected unicode, got %s" % type(v)
     return v.encode('ascii')
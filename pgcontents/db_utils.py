@@ -65,6 +65,15 @@ def _get_name(column_like):
         return column_like.clause.name
 
 
+def _no_content_field_names(fields):
+    """
+    Get the names of ``fields``, asserting that none of them is 'content'.
+    """
+    field_names = list(map(_get_name, fields))
+    assert 'content' not in field_names, "Unexpected content field."
+    return field_names
+
+
 def to_dict_no_content(fields, row):
     """
     Convert a SQLAlchemy row that does not contain a 'content' field to a dict.
@@ -75,10 +84,21 @@ def to_dict_no_content(fields, row):
     """
     assert(len(fields) == len(row))
 
-    field_names = list(map(_get_name, fields))
-    assert 'content' not in field_names, "Unexpected content field."
+    return dict(zip(_no_content_field_names(fields), row))
+
+
+def to_dicts_no_content(fields, rows):
+    """
+    Convert an iterable of SQLAlchemy rows that do not contain a 'content'
+    field to a list of dicts.
 
-    return dict(zip(field_names, row))
+    Equivalent to ``[to_dict_no_content(fields, row) for row in rows]``, but
+    only resolves the field names once.
+
+    Raises AssertionError if there is a field named 'content' in ``fields``.
+    """
+    field_names = _no_content_field_names(fields)
+    return [dict(zip(field_names, row)) for row in rows]
 
 
 def to_dict_with_content(fields, row, decrypt_func):
@@ -143,15 +143,22 @@ class PostgresContentsManager(PostgresManagerMixin, ContentsManager):
     @outside_root_to_404
     def get(self, path, content=True, type=None, format=None):
         if type is None:
-            type = self.guess_type(path)
-        try:
-            fn = {
-                'notebook': self._get_notebook,
-                'directory': self._get_directory,
-                'file': self._get_file,
-            }[type]
-        except KeyError:
-            raise ValueError("Unknown type passed: '{}'".format(type))
+            if path.endswith('.ipynb'):
+                fn = self._get_notebook
+            else:
+                # Look up the path as a directory and then as a file in a
+                # single transaction rather than probing with dir_exists
+                # before fetching.
+                fn = self._get_directory_or_file
+        else:
+            try:
+                fn = {
+                    'notebook': self._get_notebook,
+                    'directory': self._get_directory,
+                    'file': self._get_file,
+                }[type]
+            except KeyError:
+                raise ValueError("Unknown type passed: '{}'".format(type))
 
         try:
             return fn(path=path, content=content, format=format)
@@ -229,19 +236,44 @@ class PostgresContentsManager(PostgresManagerMixin, ContentsManager):
 
         return self._directory_model_from_db(record, content)
 
+    def _get_directory_or_file(self, path, content, format):
+        """
+        Get a directory or non-notebook file from the database.
+        """
+        with self.engine.begin() as db:
+            try:
+                record = get_directory(
+                    db, self.user_id, path, content
+                )
+            except NoSuchDirectory:
+                pass
+            else:
+                return self._directory_model_from_db(record, content)
+
+            try:
+                record = get_file(
+                    db,
+                    self.user_id,
+                    path,
+                    content,
+                    self.crypto.decrypt,
+                )
+            except NoSuchFile:
+                self.no_such_entity(path)
+        return self._file_model_from_db(record, content, format)
+
     def _convert_file_records(self, file_records):
         """
         Apply _notebook_model_from_db or _file_model_from_db to each entry
-        in file_records, depending on the result of `guess_type`.
+        in file_records, depending on whether the file is a notebook.
         """
+        # Records here are always files, so we can check the extension
+        # directly instead of going through guess_type.
         for record in file_records:
-            type_ = self.guess_type(record['name'], allow_directory=False)
-            if type_ == 'notebook':
+            if record['name'].endswith('.ipynb'):
                 yield self._notebook_model_from_db(record, False)
-            elif type_ == 'file':
-                yield self._file_model_from_db(record, False, None)
             else:
-                self.do_500("Unknown file type %s" % type_)
+                yield self._file_model_from_db(record, False, None)
 
     def _directory_model_from_db(self, record, content):
         """
@@ -298,45 +330,55 @@ class PostgresContentsManager(PostgresManagerMixin, ContentsManager):
                     self.no_such_entity(path)
         return self._file_model_from_db(record, content, format)
 
-    def _save_notebook(self, db, model, path):
+    def _save_notebook(self, model, path):
         """
         Save a notebook.
 
-        Returns a validation message.
+        Returns the saved file's database record and a validation message.
         """
+        # Sign, serialize, and validate the notebook before opening a
+        # transaction, so that we only hold a connection and row locks for
+        # the duration of the write itself.
         nb_contents = from_dict(model['content'])
         self.check_and_sign(nb_contents, path)
-        save_file(
-            db,
-            self.user_id,
-            path,
-            writes_base64(nb_contents),
-            self.crypto.encrypt,
-            self.max_file_size_bytes,
-        )
+        b64_content = writes_base64(nb_contents)
         # It's awkward that this writes to the model instead of returning.
         self.validate_notebook_model(model)
-        return model.get('message')
 
-    def _save_file(self, db, model, path):
+        with self.engine.begin() as db:
+            record = save_file(
+                db,
+                self.user_id,
+                path,
+                b64_content,
+                self.crypto.encrypt,
+                self.max_file_size_bytes,
+            )
+        return record, model.get('message')
+
+    def _save_file(self, model, path):
         """
         Save a non-notebook file.
+
+        Returns the saved file's database record.
         """
-        save_file(
-            db,
-            self.user_id,
-            path,
-            to_b64(model['content'], model.get('format', None)),
-            self.crypto.encrypt,
-            self.max_file_size_bytes,
-        )
-        return None
-
-    def _save_directory(self, db, path):
+        b64_content = to_b64(model['content'], model.get('format', None))
+        with self.engine.begin() as db:
+            return save_file(
+                db,
+                self.user_id,
+                path,
+                b64_content,
+                self.crypto.encrypt,
+                self.max_file_size_bytes,
+            )
+
+    def _save_directory(self, path):
         """
         'Save' a directory.
         """
-        ensure_directory(db, self.user_id, path)
+        with self.engine.begin() as db:
+            ensure_directory(db, self.user_id, path)
 
     @outside_root_to_404
     def save(self, model, path):
@@ -351,14 +393,14 @@ class PostgresContentsManager(PostgresManagerMixin, ContentsManager):
         self.log.debug("Saving %s", path)
         if model['type'] not in ('file', 'directory', 'notebook'):
             self.do_400("Unhandled contents type: %s" % model['type'])
+        record = validation_message = None
         try:
-            with self.engine.begin() as db:
-                if model['type'] == 'notebook':
-                    validation_message = self._save_notebook(db, model, path)
-                elif model['type'] == 'file':
-                    validation_message = self._save_file(db, model, path)
-                else:
-                    validation_message = self._save_directory(db, path)
+            if model['type'] == 'notebook':
+                record, validation_message = self._save_notebook(model, path)
+            elif model['type'] == 'file':
+                record = self._save_file(model, path)
+            else:
+                self._save_directory(path)
         except (web.HTTPError, PathOutsideRoot):
             raise
         except FileTooLarge:
@@ -370,8 +412,14 @@ class PostgresContentsManager(PostgresManagerMixin, ContentsManager):
                 u'Unexpected error while saving file: %s %s' % (path, e)
             )
 
-        # TODO: Consider not round-tripping to the database again here.
-        model = self.get(path, type=model['type'], content=False)
+        # save_file returns the saved record, so only directories need to be
+        # fetched again here.
+        if model['type'] == 'notebook':
+            model = self._notebook_model_from_db(record, False)
+        elif model['type'] == 'file':
+            model = self._file_model_from_db(record, False, None)
+        else:
+            model = self.get(path, type='directory', content=False)
         if validation_message is not None:
             model['message'] = validation_message
         return model
@@ -386,9 +434,9 @@ class PostgresContentsManager(PostgresManagerMixin, ContentsManager):
         """
         with self.engine.begin() as db:
             try:
-                if self.file_exists(old_path):
+                if file_exists(db, self.user_id, old_path):
                     rename_file(db, self.user_id, old_path, path)
-                elif self.dir_exists(old_path):
+                elif dir_exists(db, self.user_id, old_path):
                     rename_directory(db, self.user_id, old_path, path)
                 else:
                     self.no_such_entity(old_path)
@@ -409,29 +457,24 @@ class PostgresContentsManager(PostgresManagerMixin, ContentsManager):
                     % (old_path, e)
                 )
 
-    def _delete_non_directory(self, path):
-        with self.engine.begin() as db:
-            deleted_count = delete_file(db, self.user_id, path)
-            if not deleted_count:
-                self.no_such_entity(path)
-
-    def _delete_directory(self, path):
-        with self.engine.begin() as db:
-            try:
-                deleted_count = delete_directory(db, self.user_id, path)
-            except DirectoryNotEmpty:
-                self.not_empty(path)
-            if not deleted_count:
-                self.no_such_entity(path)
-
     @outside_root_to_404
     def delete_file(self, path):
         """
         Delete object corresponding to path.
         """
-        if self.file_exists(path):
-            self._delete_non_directory(path)
-        elif self.dir_exists(path):
-            self._delete_directory(path)
-        else:
-            self.no_such_entity(path)
+        # Try deleting a file first and fall back to a directory, rather than
+        # probing for the type of path up front.  Both attempts happen in the
+        # same transaction.
+        with self.engine.begin() as db:
+            try:
+                delete_file(db, self.user_id, path)
+                return
+            except NoSuchFile:
+                pass
+
+            try:
+                delete_directory(db, self.user_id, path)
+            except NoSuchDirectory:
+                self.no_such_entity(path)
+            except DirectoryNotEmpty:
+                self.not_empty(path)
@@ -1,32 +1,45 @@
 """
 Database Queries for PostgresContentsManager.
 """
+from itertools import islice
+
+from six import text_type
 from sqlalchemy import (
     and_,
-    cast,
+    bindparam,
+    case,
     desc,
+    exists,
     func,
+    Integer,
+    literal,
+    literal_column,
     null,
+    or_,
     select,
-    Unicode,
+    text,
+    tuple_,
+    union_all,
 )
 
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 
 from .api_utils import (
     from_api_dirname,
     from_api_filename,
     reads_base64,
+    reads_base64_json,
     split_api_filepath,
     to_api_path,
 )
 from .constants import UNLIMITED
+from .crypto import memoize_single_arg
 from .db_utils import (
-    ignore_unique_violation,
-    is_unique_violation,
     is_foreign_key_violation,
     to_dict_no_content,
     to_dict_with_content,
+    to_dicts_no_content,
 )
 from .error import (
     CorruptedFile,
@@ -73,6 +86,24 @@ def unused_decrypt_func(s):
     raise AssertionError("Unexpected decrypt call.")
 
 
+# ====================
+# Prebuilt Statements
+# ====================
+
+# Compiled SQL for statements that are built once at import time.  Only those
+# statements are executed with this cache, so its size stays bounded.
+_compiled_cache = {}
+
+
+def _execute_prebuilt(db, statement, **params):
+    """
+    Execute a statement built at import time, reusing its compiled SQL.
+    """
+    return db.execution_options(
+        compiled_cache=_compiled_cache,
+    ).execute(statement, **params)
+
+
 # =====
 # Users
 # =====
@@ -85,33 +116,37 @@ def ensure_db_user(db, user_id):
     """
     Add a new user if they don't already exist.
     """
-    with ignore_unique_violation():
-        db.execute(
-            users.insert().values(id=user_id),
-        )
+    db.execute(
+        pg_insert(users).values(id=user_id).on_conflict_do_nothing(),
+    )
+
+
+# Built once at import time.  The files and directories are deleted in
+# data-modifying CTEs so that the whole purge is a single statement.  Foreign
+# key checks run at the end of the statement, after all three deletes.
+_purge_user_query = text(
+    'WITH deleted_files AS ('
+    ' DELETE FROM pgcontents.files WHERE user_id = :user_id'
+    '), deleted_directories AS ('
+    ' DELETE FROM pgcontents.directories WHERE user_id = :user_id'
+    ') '
+    'DELETE FROM pgcontents.users WHERE id = :user_id'
+)
 
 
 def purge_user(db, user_id):
     """
     Delete a user and all of their resources.
     """
-    db.execute(files.delete().where(
-        files.c.user_id == user_id
-    ))
-    db.execute(directories.delete().where(
-        directories.c.user_id == user_id
-    ))
-    db.execute(users.delete().where(
-        users.c.id == user_id
-    ))
+    _execute_prebuilt(db, _purge_user_query, user_id=user_id)
 
 
 # ===========
 # Directories
 # ===========
-def create_directory(db, user_id, api_path):
+def _directory_values(user_id, api_path):
     """
-    Create a directory.
+    Return the column values for a new directory row.
     """
     name = from_api_dirname(api_path)
     if name == '/':
@@ -122,13 +157,20 @@ def create_directory(db, user_id, api_path):
         parent_name = name[:name.rindex('/', 0, -1) + 1]
         parent_user_id = user_id
 
+    return {
+        'name': name,
+        'user_id': user_id,
+        'parent_name': parent_name,
+        'parent_user_id': parent_user_id,
+    }
+
+
+def create_directory(db, user_id, api_path):
+    """
+    Create a directory.
+    """
     db.execute(
-        directories.insert().values(
-            name=name,
-            user_id=user_id,
-            parent_name=parent_name,
-            parent_user_id=parent_user_id,
-        )
+        directories.insert().values(**_directory_values(user_id, api_path))
     )
 
 
@@ -136,8 +178,37 @@ def ensure_directory(db, user_id, api_path):
     """
     Ensure that the given user has the given directory.
     """
-    with ignore_unique_violation():
-        create_directory(db, user_id, api_path)
+    db.execute(
+        pg_insert(directories).values(
+            **_directory_values(user_id, api_path)
+        ).on_conflict_do_nothing()
+    )
+
+
+def ensure_directories(db, user_id, api_paths):
+    """
+    Ensure that the given user has all of the given directories, creating
+    any that are missing in a single statement.
+
+    A directory's parent must either exist already or be included in
+    api_paths.  Foreign keys are checked at the end of the statement, so
+    parents and children may be created together.
+
+    Returns the number of directories created.
+    """
+    rows = {}
+    for api_path in api_paths:
+        values = _directory_values(user_id, api_path)
+        rows[values['name']] = values
+    if not rows:
+        return 0
+
+    result = db.execute(
+        pg_insert(directories).values(
+            [rows[name] for name in sorted(rows)]
+        ).on_conflict_do_nothing()
+    )
+    return result.rowcount
 
 
 def _is_in_directory(table, user_id, db_dirname):
@@ -189,6 +260,80 @@ def delete_directory(db, user_id, api_path):
     return rowcount
 
 
+def _first_nonempty_directory(db, user_id, db_dirnames):
+    """
+    Return the first of ``db_dirnames`` that contains files, or contains
+    subdirectories that aren't also in ``db_dirnames``.
+
+    Returns None if all of the directories could be deleted together.
+    """
+    children = directories.alias('children')
+    return db.execute(
+        select([
+            directories.c.name,
+        ]).where(
+            and_(
+                directories.c.user_id == user_id,
+                directories.c.name.in_(db_dirnames),
+                or_(
+                    exists().where(
+                        _is_in_directory(files, user_id, directories.c.name),
+                    ),
+                    exists().where(
+                        and_(
+                            _is_in_directory(
+                                children,
+                                user_id,
+                                directories.c.name,
+                            ),
+                            children.c.name.notin_(db_dirnames),
+                        ),
+                    ),
+                ),
+            ),
+        ).order_by(
+            directories.c.name,
+        ).limit(1)
+    ).scalar()
+
+
+def delete_directories(db, user_id, api_paths):
+    """
+    Delete several directories in a single statement.
+
+    Paths that don't exist are ignored.  Raises DirectoryNotEmpty for the
+    first directory that still contains files, or contains subdirectories
+    that aren't also being deleted.
+
+    Returns the number of directories deleted.
+    """
+    db_dirnames = [from_api_dirname(api_path) for api_path in api_paths]
+    if not db_dirnames:
+        return 0
+
+    try:
+        # Delete inside a savepoint so that the transaction is still usable
+        # for finding the offending directory if the delete fails.
+        with db.begin_nested():
+            result = db.execute(
+                directories.delete().where(
+                    and_(
+                        directories.c.user_id == user_id,
+                        directories.c.name.in_(db_dirnames),
+                    )
+                )
+            )
+    except IntegrityError as error:
+        if not is_foreign_key_violation(error):
+            raise
+        nonempty = _first_nonempty_directory(db, user_id, db_dirnames)
+        if nonempty is None:
+            raise error
+        raise DirectoryNotEmpty(to_api_path(nonempty))
+
+    return result.rowcount
+
+
 def dir_exists(db, user_id, api_dirname):
     """
     Check if a directory exists.
@@ -196,22 +341,46 @@ def dir_exists(db, user_id, api_dirname):
     return _dir_exists(db, user_id, from_api_dirname(api_dirname))
 
 
+# Built once at import time so that the statement doesn't need to be
+# reconstructed on every existence check.
+_dir_exists_query = select(
+    [literal_column('1')],
+).where(
+    and_(
+        directories.c.user_id == bindparam('user_id'),
+        directories.c.name == bindparam('name'),
+    ),
+).limit(1)
+
+
 def _dir_exists(db, user_id, db_dirname):
     """
     Internal implementation of dir_exists.
 
     Expects a db-style path name.
     """
-    return db.execute(
-        select(
-            [func.count(directories.c.name)],
-        ).where(
-            and_(
-                directories.c.user_id == user_id,
-                directories.c.name == db_dirname,
-            ),
-        )
-    ).scalar() != 0
+    return _execute_prebuilt(
+        db,
+        _dir_exists_query,
+        user_id=user_id,
+        name=db_dirname,
+    ).first() is not None
+
+
+def _files_in_directory_query(fields, user_id, db_dirname):
+    """
+    Return a SELECT statement for ``fields`` of the files in a directory.
+    """
+    # uix_filepath_username guarantees at most one row per file name, so
+    # there's no need to deduplicate versions of the same file.  Ordering by
+    # name lets Postgres read rows straight from that index without sorting.
+    return select(
+        fields,
+    ).where(
+        _is_in_directory(files, user_id, db_dirname),
+    ).order_by(
+        files.c.name,
+    )
 
 
 def files_in_directory(db, user_id, db_dirname):
@@ -220,20 +389,9 @@ def files_in_directory(db, user_id, db_dirname):
     """
     fields = _file_default_fields()
     rows = db.execute(
-        select(
-            fields,
-        ).where(
-            _is_in_directory(files, user_id, db_dirname),
-        ).order_by(
-            files.c.user_id,
-            files.c.parent_name,
-            files.c.name,
-            files.c.created_at,
-        ).distinct(
-            files.c.user_id, files.c.parent_name, files.c.name,
-        )
+        _files_in_directory_query(fields, user_id, db_dirname),
     )
-    return [to_dict_no_content(fields, row) for row in rows]
+    return to_dicts_no_content(fields, rows)
 
 
 def directories_in_directory(db, user_id, db_dirname):
@@ -248,7 +406,80 @@ def directories_in_directory(db, user_id, db_dirname):
             _is_in_directory(directories, user_id, db_dirname),
         )
     )
-    return [to_dict_no_content(fields, row) for row in rows]
+    return to_dicts_no_content(fields, rows)
+
+
+# Built once at import time.  Rows from each source are tagged with a 'kind'
+# column: 'x' for the directory itself, 'f' for files, and 'd' for
+# subdirectories.
+_directory_listing_query = union_all(
+    select([
+        literal('x').label('kind'),
+        directories.c.name,
+        null().label('created_at'),
+        null().label('parent_name'),
+    ]).where(
+        and_(
+            directories.c.user_id == bindparam('user_id'),
+            directories.c.name == bindparam('dirname'),
+        ),
+    ),
+    select([
+        literal('f').label('kind'),
+        files.c.name,
+        files.c.created_at,
+        files.c.parent_name,
+    ]).where(
+        _is_in_directory(files, bindparam('user_id'), bindparam('dirname')),
+    ),
+    select([
+        literal('d').label('kind'),
+        directories.c.name,
+        null().label('created_at'),
+        null().label('parent_name'),
+    ]).where(
+        _is_in_directory(
+            directories,
+            bindparam('user_id'),
+            bindparam('dirname'),
+        ),
+    ),
+).order_by(
+    literal_column('kind'),
+    literal_column('name'),
+)
+
+
+def _directory_listing(db, user_id, db_dirname):
+    """
+    Return the files and subdirectories of a directory with a single query.
+
+    Returns None if the directory doesn't exist.
+    """
+    rows = _execute_prebuilt(
+        db,
+        _directory_listing_query,
+        user_id=user_id,
+        dirname=db_dirname,
+    )
+
+    found = False
+    file_records, subdir_records = [], []
+    for kind, name, created_at, parent_name in rows:
+        if kind == 'x':
+            found = True
+        elif kind == 'f':
+            file_records.append({
+                'name': name,
+                'created_at': created_at,
+                'parent_name': parent_name,
+            })
+        else:
+            subdir_records.append({'name': name})
+
+    if not found:
+        return None
+    return file_records, subdir_records
 
 
 def get_directory(db, user_id, api_dirname, content):
@@ -260,20 +491,14 @@ def get_directory(db, user_id, api_dirname, content):
     name.
     """
     db_dirname = from_api_dirname(api_dirname)
-    if not _dir_exists(db, user_id, db_dirname):
-        raise NoSuchDirectory(api_dirname)
     if content:
-        files = files_in_directory(
-            db,
-            user_id,
-            db_dirname,
-        )
-        subdirectories = directories_in_directory(
-            db,
-            user_id,
-            db_dirname,
-        )
+        listing = _directory_listing(db, user_id, db_dirname)
+        if listing is None:
+            raise NoSuchDirectory(api_dirname)
+        files, subdirectories = listing
     else:
+        if not _dir_exists(db, user_id, db_dirname):
+            raise NoSuchDirectory(api_dirname)
         files, subdirectories = None, None
 
     # TODO: Consider using namedtuples for these return values.
@@ -284,6 +509,56 @@ def get_directory(db, user_id, api_dirname, content):
     }
 
 
+def get_directory_subtree(db, user_id, api_dirname):
+    """
+    Return records for api_dirname and all of its descendants.
+
+    The result is a dict mapping database-style directory names to records in
+    the same format returned by ``get_directory(..., content=True)``.  The
+    whole subtree is loaded with one query per table, rather than one
+    ``get_directory`` call per subdirectory.
+    """
+    db_dirname = from_api_dirname(api_dirname)
+
+    dir_rows = db.execute(
+        select(
+            [directories.c.name, directories.c.parent_name],
+        ).where(
+            and_(
+                directories.c.user_id == user_id,
+                directories.c.name.startswith(db_dirname, autoescape=True),
+            ),
+        )
+    ).fetchall()
+
+    tree = {
+        name: {'name': name, 'files': [], 'subdirs': []}
+        for name, _ in dir_rows
+    }
+    if db_dirname not in tree:
+        raise NoSuchDirectory(api_dirname)
+
+    for name, parent_name in dir_rows:
+        if name != db_dirname:
+            tree[parent_name]['subdirs'].append({'name': name})
+
+    fields = _file_default_fields()
+    file_rows = db.execute(
+        select(
+            fields,
+        ).where(
+            and_(
+                files.c.user_id == user_id,
+                files.c.parent_name.startswith(db_dirname, autoescape=True),
+            ),
+        )
+    )
+    for record in to_dicts_no_content(fields, file_rows):
+        tree[record['parent_name']]['files'].append(record)
+
+    return tree
+
+
 # =====
 # Files
 # =====
@@ -299,6 +574,27 @@ def _file_where(user_id, api_path):
     )
 
 
+# WHERE clause for statements built once at import time.  Matches the file
+# located by the bind parameters returned by _file_params.
+_file_where_params = and_(
+    files.c.name == bindparam('name'),
+    files.c.user_id == bindparam('user_id'),
+    files.c.parent_name == bindparam('parent_name'),
+)
+
+
+def _file_params(user_id, api_path):
+    """
+    Return bind parameters for a statement filtered on _file_where_params.
+    """
+    directory, name = split_api_filepath(api_path)
+    return {
+        'name': name,
+        'user_id': user_id,
+        'parent_name': directory,
+    }
+
+
 def _file_creation_order():
     """
     Return an order_by on file creation date.
@@ -306,12 +602,14 @@ def _file_creation_order():
     return desc(files.c.created_at)
 
 
-def _select_file(user_id, api_path, fields, limit):
+def _select_file(fields, limit):
     """
     Return a SELECT statement that returns the latest N versions of a file.
+
+    The file's location is left as bind parameters.  See ``_file_params``.
     """
     query = select(fields).where(
-        _file_where(user_id, api_path),
+        _file_where_params,
     ).order_by(
         _file_creation_order(),
     )
@@ -332,14 +630,39 @@ def _file_default_fields():
     ]
 
 
-def _get_file(db, user_id, api_path, query_fields, decrypt_func):
+def _file_saved_fields():
+    """
+    Fields returned by save_file.
     """
-    Get file data for the given user_id, path, and query_fields.  The
-    query_fields parameter specifies which database fields should be
+    return [files.c.id] + _file_default_fields()
+
+
+# Built once at import time so that the statements don't need to be
+# reconstructed every time a file is looked up.
+_get_file_fields = _file_default_fields()
+_get_file_query = _select_file(_get_file_fields, limit=1)
+
+_get_file_with_content_fields = _file_default_fields() + [files.c.content]
+_get_file_with_content_query = _select_file(
+    _get_file_with_content_fields,
+    limit=1,
+)
+
+_get_file_id_fields = [files.c.id]
+_get_file_id_query = _select_file(_get_file_id_fields, limit=1)
+
+
+def _get_file(db, user_id, api_path, query, query_fields, decrypt_func):
+    """
+    Get file data for the given user_id and path by running ``query``, which
+    should be a statement built by ``_select_file`` for ``query_fields``.
+    The query_fields parameter specifies which database fields should be
     included in the returned file data.
     """
-    result = db.execute(
-        _select_file(user_id, api_path, query_fields, limit=1),
+    result = _execute_prebuilt(
+        db,
+        query,
+        **_file_params(user_id, api_path)
     ).first()
 
     if result is None:
@@ -357,11 +680,14 @@ def get_file(db, user_id, api_path, include_content, decrypt_func):
 
     Include content only if include_content=True.
     """
-    query_fields = _file_default_fields()
     if include_content:
-        query_fields.append(files.c.content)
+        query = _get_file_with_content_query
+        query_fields = _get_file_with_content_fields
+    else:
+        query = _get_file_query
+        query_fields = _get_file_fields
 
-    return _get_file(db, user_id, api_path, query_fields, decrypt_func)
+    return _get_file(db, user_id, api_path, query, query_fields, decrypt_func)
 
 
 def get_file_id(db, user_id, api_path):
@@ -373,21 +699,27 @@ def get_file_id(db, user_id, api_path):
         db,
         user_id,
         api_path,
-        [files.c.id],
+        _get_file_id_query,
+        _get_file_id_fields,
         unused_decrypt_func,
     )['id']
 
 
+# Built once at import time so that the statement doesn't need to be
+# reconstructed every time a file is deleted.
+_delete_file_query = files.delete().where(_file_where_params)
+
+
 def delete_file(db, user_id, api_path):
     """
     Delete a file.
 
     TODO: Consider making this a soft delete.
     """
-    result = db.execute(
-        files.delete().where(
-            _file_where(user_id, api_path)
-        )
+    result = _execute_prebuilt(
+        db,
+        _delete_file_query,
+        **_file_params(user_id, api_path)
     )
 
     rowcount = result.rowcount
@@ -397,42 +729,90 @@ def delete_file(db, user_id, api_path):
     return rowcount
 
 
+def delete_files(db, user_id, api_paths):
+    """
+    Delete several files in a single statement.
+
+    Paths that don't exist are ignored.  Returns the number of files deleted.
+    """
+    keys = [split_api_filepath(api_path) for api_path in api_paths]
+    if not keys:
+        return 0
+
+    result = db.execute(
+        files.delete().where(
+            and_(
+                files.c.user_id == user_id,
+                tuple_(files.c.parent_name, files.c.name).in_(keys),
+            )
+        )
+    )
+    return result.rowcount
+
+
+# Built once at import time so that the statement doesn't need to be
+# reconstructed on every existence check.
+_file_exists_query = select(
+    [literal_column('1')],
+).where(
+    _file_where_params,
+).limit(1)
+
+
 def file_exists(db, user_id, path):
     """
     Check if a file exists.
     """
-    try:
-        get_file(
-            db,
-            user_id,
-            path,
-            include_content=False,
-            decrypt_func=unused_decrypt_func,
-        )
-        return True
-    except NoSuchFile:
-        return False
+    return _execute_prebuilt(
+        db,
+        _file_exists_query,
+        **_file_params(user_id, path)
+    ).first() is not None
 
 
 def rename_file(db, user_id, old_api_path, new_api_path):
     """
     Rename a file.
     """
-    # Overwriting existing files is disallowed.
-    if file_exists(db, user_id, new_api_path):
-        raise FileExists(new_api_path)
-
     new_dir, new_name = split_api_filepath(new_api_path)
 
-    db.execute(
+    # Overwriting existing files is disallowed, so only rename if there's no
+    # file at the destination and the destination directory exists.  Checking
+    # for both in the UPDATE itself saves round trips over checking before
+    # updating.
+    existing = files.alias('existing')
+    result = db.execute(
         files.update().where(
-            _file_where(user_id, old_api_path),
+            and_(
+                _file_where(user_id, old_api_path),
+                ~exists().where(
+                    and_(
+                        existing.c.user_id == user_id,
+                        existing.c.parent_name == new_dir,
+                        existing.c.name == new_name,
+                    ),
+                ),
+                exists().where(
+                    and_(
+                        directories.c.user_id == user_id,
+                        directories.c.name == new_dir,
+                    ),
+                ),
+            ),
         ).values(
             name=new_name,
             parent_name=new_dir,
             created_at=func.now(),
         )
     )
+    if result.rowcount:
+        return
+
+    # Nothing was renamed.  Figure out why.
+    if file_exists(db, user_id, new_api_path):
+        raise FileExists(new_api_path)
+    if not _dir_exists(db, user_id, new_dir):
+        raise NoSuchDirectory(to_api_path(new_dir))
 
 
 def rename_directory(db, user_id, old_api_path, new_api_path):
@@ -497,11 +877,31 @@ def rename_directory(db, user_id, old_api_path, new_api_path):
     )
 
 
+# Built once at import time so that the upsert doesn't need to be
+# reconstructed every time a file is saved.  The inserted values are taken
+# from the bind parameters passed at execution time.
+_save_file_fields = _file_saved_fields()
+_save_file_insert = pg_insert(files)
+_save_file_query = _save_file_insert.on_conflict_do_update(
+    constraint='uix_filepath_username',
+    set_={
+        'content': _save_file_insert.excluded.content,
+        'created_at': func.now(),
+    },
+).returning(
+    *_save_file_fields
+)
+
+
 def save_file(db, user_id, path, content, encrypt_func, max_size_bytes):
     """
     Save a file.
 
-    TODO: Update-then-insert is probably cheaper than insert-then-update.
+    If the file already exists, its content is overwritten with the newer
+    version.
+
+    Returns a dict containing the id, name, parent_name, and created_at of
+    the saved file.
     """
     content = preprocess_incoming_content(
         content,
@@ -509,38 +909,63 @@ def save_file(db, user_id, path, content, encrypt_func, max_size_bytes):
         max_size_bytes,
     )
     directory, name = split_api_filepath(path)
-    with db.begin_nested() as savepoint:
-        try:
-            res = db.execute(
-                files.insert().values(
-                    name=name,
-                    user_id=user_id,
-                    parent_name=directory,
-                    content=content,
-                )
-            )
-        except IntegrityError as error:
-            # The file already exists, so overwrite its content with the newer
-            # version.
-            if is_unique_violation(error):
-                savepoint.rollback()
-                res = db.execute(
-                    files.update().where(
-                        _file_where(user_id, path),
-                    ).values(
-                        content=content,
-                        created_at=func.now(),
-                    )
-                )
-            else:
-                # Unknown error.  Reraise
-                raise
+    res = _execute_prebuilt(
+        db,
+        _save_file_query,
+        name=name,
+        user_id=user_id,
+        parent_name=directory,
+        content=content,
+    ).first()
+
+    return to_dict_no_content(_save_file_fields, res)
+
+
+def save_files(db, user_id, items, encrypt_func, max_size_bytes):
+    """
+    Save several files in a single statement.
 
-    return res
+    items is an iterable of (path, content) pairs.  Existing files are
+    overwritten, as in save_file.  If a path appears more than once, the
+    last content given for it is saved.
+
+    Returns a list of dicts containing the id, name, parent_name, and
+    created_at of each saved file.
+    """
+    rows = {}
+    for path, content in items:
+        directory, name = split_api_filepath(path)
+        rows[directory, name] = {
+            'name': name,
+            'user_id': user_id,
+            'parent_name': directory,
+            'content': preprocess_incoming_content(
+                content,
+                encrypt_func,
+                max_size_bytes,
+            ),
+        }
+    if not rows:
+        return []
+
+    return_fields = _file_saved_fields()
+    insert = pg_insert(files).values([rows[key] for key in sorted(rows)])
+    res = db.execute(
+        insert.on_conflict_do_update(
+            constraint='uix_filepath_username',
+            set_={
+                'content': insert.excluded.content,
+                'created_at': func.now(),
+            },
+        ).returning(
+            *return_fields
+        )
+    )
+    return to_dicts_no_content(return_fields, res)
 
 
 def generate_files(engine, crypto_factory, min_dt=None, max_dt=None,
-                   logger=None):
+                   logger=None, parse=True):
     """
     Create a generator of decrypted files.
 
@@ -564,9 +989,13 @@ def generate_files(engine, crypto_factory, min_dt=None, max_dt=None,
     max_dt : datetime.datetime, optional
         Last modified datetime at and after which a file will be excluded.
     logger : Logger, optional
+    parse : bool, optional
+        If False, yield each notebook's content as JSON-encoded bytes instead
+        of a parsed notebook.  Unparsed content is not validated.
     """
     return _generate_notebooks(files, files.c.created_at,
-                               engine, crypto_factory, min_dt, max_dt, logger)
+                               engine, crypto_factory, min_dt, max_dt, logger,
+                               parse)
 
 
 # =======================================
@@ -574,21 +1003,51 @@ def generate_files(engine, crypto_factory, min_dt=None, max_dt=None,
 # =======================================
 def _remote_checkpoint_default_fields():
     return [
-        cast(remote_checkpoints.c.id, Unicode),
+        remote_checkpoints.c.id,
         remote_checkpoints.c.last_modified,
     ]
 
 
+def _remote_checkpoint_to_dict(row):
+    """
+    Convert a row of default checkpoint fields to a dict.
+
+    Checkpoint ids are strings in the Jupyter API.  They're converted here
+    rather than with a CAST in every query.
+    """
+    id_, last_modified = row
+    return {'id': text_type(id_), 'last_modified': last_modified}
+
+
+def _checkpoint_id_param(checkpoint_id):
+    """
+    Return an integer bind parameter for a checkpoint id.
+
+    Checkpoint ids are exposed to the API as strings (see
+    ``_remote_checkpoint_to_dict``), so they're converted back to
+    integers here before being compared against the id column.
+    """
+    return bindparam('checkpoint_id', int(checkpoint_id), type_=Integer)
+
+
+# Built once at import time so that the statement doesn't need to be
+# reconstructed every time a checkpoint is deleted.
+_delete_single_remote_checkpoint_query = remote_checkpoints.delete().where(
+    and_(
+        remote_checkpoints.c.user_id == bindparam('user_id'),
+        remote_checkpoints.c.path == bindparam('path'),
+        remote_checkpoints.c.id == bindparam('checkpoint_id', type_=Integer),
+    ),
+)
+
+
 def delete_single_remote_checkpoint(db, user_id, api_path, checkpoint_id):
-    db_path = from_api_filename(api_path)
-    result = db.execute(
-        remote_checkpoints.delete().where(
-            and_(
-                remote_checkpoints.c.user_id == user_id,
-                remote_checkpoints.c.path == db_path,
-                remote_checkpoints.c.id == int(checkpoint_id),
-            ),
-        ),
+    result = _execute_prebuilt(
+        db,
+        _delete_single_remote_checkpoint_query,
+        user_id=user_id,
+        path=from_api_filename(api_path),
+        checkpoint_id=int(checkpoint_id),
     )
 
     if not result.rowcount:
@@ -607,21 +1066,30 @@ def delete_remote_checkpoints(db, user_id, api_path):
     )
 
 
+# Built once at import time so that the statement doesn't need to be
+# reconstructed every time checkpoints are listed.
+_list_remote_checkpoints_fields = _remote_checkpoint_default_fields()
+_list_remote_checkpoints_query = select(
+    _list_remote_checkpoints_fields,
+).where(
+    and_(
+        remote_checkpoints.c.user_id == bindparam('user_id'),
+        remote_checkpoints.c.path == bindparam('path'),
+    ),
+).order_by(
+    desc(remote_checkpoints.c.last_modified),
+)
+
+
 def list_remote_checkpoints(db, user_id, api_path):
-    db_path = from_api_filename(api_path)
-    fields = _remote_checkpoint_default_fields()
-    results = db.execute(
-        select(fields).where(
-            and_(
-                remote_checkpoints.c.user_id == user_id,
-                remote_checkpoints.c.path == db_path,
-            ),
-        ).order_by(
-            desc(remote_checkpoints.c.last_modified),
-        ),
+    results = _execute_prebuilt(
+        db,
+        _list_remote_checkpoints_query,
+        user_id=user_id,
+        path=from_api_filename(api_path),
     )
 
-    return [to_dict_no_content(fields, row) for row in results]
+    return [_remote_checkpoint_to_dict(row) for row in results]
 
 
 def move_single_remote_checkpoint(db,
@@ -636,7 +1104,7 @@ def move_single_remote_checkpoint(db,
             and_(
                 remote_checkpoints.c.user_id == user_id,
                 remote_checkpoints.c.path == src_db_path,
-                remote_checkpoints.c.id == int(checkpoint_id),
+                remote_checkpoints.c.id == _checkpoint_id_param(checkpoint_id),
             ),
         ).values(
             path=dest_db_path,
@@ -651,26 +1119,24 @@ def move_remote_checkpoints(db, user_id, src_api_path, dest_api_path):
     src_db_path = from_api_filename(src_api_path)
     dest_db_path = from_api_filename(dest_api_path)
 
-    # Update the paths of the checkpoints for the file being renamed. If the
-    # source path is for a directory then this is a no-op.
-    db.execute(
-        remote_checkpoints.update().where(
-            and_(
-                remote_checkpoints.c.user_id == user_id,
-                remote_checkpoints.c.path == src_db_path,
-            ),
-        ).values(
-            path=dest_db_path,
-        ),
-    )
-
-    # If the given source path is for a directory, update the paths of the
-    # checkpoints for all files in that directory and its subdirectories.
+    # Update the paths of the checkpoints for the file being renamed or, if
+    # the source path is for a directory, for all files in that directory and
+    # its subdirectories.  Match descendants on the directory name with a
+    # trailing slash so that moving '/foo' doesn't also move checkpoints for
+    # '/foobar'.  Replacing the source prefix with the destination handles
+    # both cases in one statement, since for an exact match the remainder of
+    # the path is empty.
     db.execute(
         remote_checkpoints.update().where(
             and_(
                 remote_checkpoints.c.user_id == user_id,
-                remote_checkpoints.c.path.startswith(src_db_path),
+                or_(
+                    remote_checkpoints.c.path == src_db_path,
+                    remote_checkpoints.c.path.startswith(
+                        src_db_path + '/',
+                        autoescape=True,
+                    ),
+                ),
             ),
         ).values(
             path=func.concat(
@@ -684,25 +1150,44 @@ def move_remote_checkpoints(db, user_id, src_api_path, dest_api_path):
     )
 
 
+# Built once at import time so that the statement doesn't need to be
+# reconstructed every time a checkpoint is read.
+_get_remote_checkpoint_fields = [remote_checkpoints.c.content]
+_get_remote_checkpoint_query = select(
+    _get_remote_checkpoint_fields,
+).where(
+    and_(
+        remote_checkpoints.c.user_id == bindparam('user_id'),
+        remote_checkpoints.c.path == bindparam('path'),
+        remote_checkpoints.c.id == bindparam('checkpoint_id', type_=Integer),
+    ),
+)
+
+
 def get_remote_checkpoint(db, user_id, api_path, checkpoint_id, decrypt_func):
-    db_path = from_api_filename(api_path)
-    fields = [remote_checkpoints.c.content]
-    result = db.execute(
-        select(
-            fields,
-        ).where(
-            and_(
-                remote_checkpoints.c.user_id == user_id,
-                remote_checkpoints.c.path == db_path,
-                remote_checkpoints.c.id == int(checkpoint_id),
-            ),
-        )
+    result = _execute_prebuilt(
+        db,
+        _get_remote_checkpoint_query,
+        user_id=user_id,
+        path=from_api_filename(api_path),
+        checkpoint_id=int(checkpoint_id),
     ).first()  # NOTE: This applies a LIMIT 1 to the query.
 
     if result is None:
         raise NoSuchCheckpoint(api_path, checkpoint_id)
 
-    return to_dict_with_content(fields, result, decrypt_func)
+    return to_dict_with_content(
+        _get_remote_checkpoint_fields,
+        result,
+        decrypt_func,
+    )
+
+
+# Built once at import time so that the statement doesn't need to be
+# reconstructed every time a checkpoint is saved.
+_save_remote_checkpoint_query = remote_checkpoints.insert().returning(
+    *_remote_checkpoint_default_fields()
+)
 
 
 def save_remote_checkpoint(db,
@@ -719,18 +1204,15 @@ def save_remote_checkpoint(db,
         encrypt_func,
         max_size_bytes,
     )
-    return_fields = _remote_checkpoint_default_fields()
-    result = db.execute(
-        remote_checkpoints.insert().values(
-            user_id=user_id,
-            path=from_api_filename(api_path),
-            content=content,
-        ).returning(
-            *return_fields
-        ),
+    result = _execute_prebuilt(
+        db,
+        _save_remote_checkpoint_query,
+        user_id=user_id,
+        path=from_api_filename(api_path),
+        content=content,
     ).first()
 
-    return to_dict_no_content(return_fields, result)
+    return _remote_checkpoint_to_dict(result)
 
 
 def purge_remote_checkpoints(db, user_id):
@@ -745,7 +1227,7 @@ def purge_remote_checkpoints(db, user_id):
 
 
 def generate_checkpoints(engine, crypto_factory, min_dt=None, max_dt=None,
-                         logger=None):
+                         logger=None, parse=True):
     """
     Create a generator of decrypted remote checkpoints.
 
@@ -769,17 +1251,22 @@ def generate_checkpoints(engine, crypto_factory, min_dt=None, max_dt=None,
     max_dt : datetime.datetime, optional
         Last modified datetime at and after which a file will be excluded.
     logger : Logger, optional
+    parse : bool, optional
+        If False, yield each notebook's content as JSON-encoded bytes instead
+        of a parsed notebook.  Unparsed content is not validated.
     """
     return _generate_notebooks(remote_checkpoints,
                                remote_checkpoints.c.last_modified,
-                               engine, crypto_factory, min_dt, max_dt, logger)
+                               engine, crypto_factory, min_dt, max_dt, logger,
+                               parse)
 
 
 # ====================
 # Files or Checkpoints
 # ====================
 def _generate_notebooks(table, timestamp_column,
-                        engine, crypto_factory, min_dt, max_dt, logger):
+                        engine, crypto_factory, min_dt, max_dt, logger,
+                        parse):
     """
     See docstrings for `generate_files` and `generate_checkpoints`.
 
@@ -800,6 +1287,8 @@ def _generate_notebooks(table, timestamp_column,
     max_dt : datetime.datetime
         Last modified datetime at and after which a file will be excluded.
     logger : Logger
+    parse : bool
+        Whether to parse notebook content or yield it as JSON-encoded bytes.
     """
     where_conds = []
     if min_dt is not None:
@@ -810,41 +1299,60 @@ def _generate_notebooks(table, timestamp_column,
         # Only select files that are notebooks
         where_conds.append(files.c.name.like(u'%.ipynb'))
 
-    # Query for notebooks satisfying the conditions.
-    query = select([table]).order_by(timestamp_column)
+    if table is files:
+        # Correct for files schema differing somewhat from checkpoints.
+        path_column = func.concat(files.c.parent_name, files.c.name)
+    else:
+        path_column = table.c.path
+
+    # Query for notebooks satisfying the conditions.  Columns are selected in
+    # the same order for both tables, so rows can be unpacked positionally.
+    query = select([
+        table.c.id,
+        table.c.user_id,
+        path_column,
+        timestamp_column,
+        table.c.content,
+    ]).order_by(timestamp_column)
     for cond in where_conds:
         query = query.where(cond)
-    result = engine.execute(query)
-
-    # Decrypt each notebook and yield the result.
-    for nb_row in result:
-        try:
-            # The decrypt function depends on the user
-            user_id = nb_row['user_id']
-            decrypt_func = crypto_factory(user_id).decrypt
-
-            nb_dict = to_dict_with_content(table.c, nb_row, decrypt_func)
-            if table is files:
-                # Correct for files schema differing somewhat from checkpoints.
-                nb_dict['path'] = nb_dict['parent_name'] + nb_dict['name']
-                nb_dict['last_modified'] = nb_dict['created_at']
-
-            # For 'content', we use `reads_base64` directly. If the db content
-            # format is changed from base64, the decoding should be changed
-            # here as well.
-            yield {
-                'id': nb_dict['id'],
-                'user_id': user_id,
-                'path': to_api_path(nb_dict['path']),
-                'last_modified': nb_dict['last_modified'],
-                'content': reads_base64(nb_dict['content']),
-            }
-        except CorruptedFile:
-            if logger is not None:
-                logger.warning(
-                    'Corrupted file with id %d in table %s.'
-                    % (nb_row['id'], table.name)
-                )
+
+    # For 'content', we use `reads_base64` or `reads_base64_json` directly. If
+    # the db content format is changed from base64, the decoding should be
+    # changed here as well.
+    reads = reads_base64 if parse else reads_base64_json
+
+    # The decrypt function depends on the user.  Only construct each user's
+    # crypto once, since crypto_factory may need to derive a key.
+    @memoize_single_arg
+    def get_decrypt_func(user_id):
+        return crypto_factory(user_id).decrypt
+
+    # Use a server-side cursor so that we only hold a bounded number of
+    # notebooks in memory at a time, rather than the entire result set.
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True,
+            max_row_buffer=100,
+        ).execute(query)
+
+        # Decrypt each notebook and yield the result.
+        for nb_id, user_id, path, last_modified, content in result:
+            try:
+                decrypt_func = get_decrypt_func(user_id)
+                yield {
+                    'id': nb_id,
+                    'user_id': user_id,
+                    'path': to_api_path(path),
+                    'last_modified': last_modified,
+                    'content': reads(decrypt_func(content)),
+                }
+            except CorruptedFile:
+                if logger is not None:
+                    logger.warning(
+                        'Corrupted file with id %d in table %s.'
+                        % (nb_id, table.name)
+                    )
 
 
 ##########################
@@ -859,20 +1367,63 @@ def reencrypt_row_content(db,
     """
     Re-encrypt a row from ``table`` with ``id`` of ``row_id``.
     """
-    q = (select([table.c.content])
+    reencrypt_rows_content(
+        db,
+        table,
+        [row_id],
+        decrypt_func,
+        encrypt_func,
+        logger,
+    )
+
+
+def reencrypt_rows_content(db,
+                           table,
+                           row_ids,
+                           decrypt_func,
+                           encrypt_func,
+                           logger):
+    """
+    Re-encrypt the rows from ``table`` whose ids are in ``row_ids``.
+
+    All rows are locked and fetched with a single SELECT, and written back
+    with a single UPDATE.
+    """
+    q = (select([table.c.id, table.c.content])
          .with_for_update()
-         .where(table.c.id == row_id))
+         .where(table.c.id.in_(row_ids)))
 
-    [(content,)] = db.execute(q)
+    rows = db.execute(q).fetchall()
+    if not rows:
+        return
 
-    logger.info("Begin encrypting %s row %s.", table.name, row_id)
+    logger.info("Begin encrypting %d %s rows.", len(rows), table.name)
+    new_content = {
+        row_id: literal(
+            encrypt_func(decrypt_func(content)),
+            table.c.content.type,
+        )
+        for row_id, content in rows
+    }
     db.execute(
         table
         .update()
-        .where(table.c.id == row_id)
-        .values(content=encrypt_func(decrypt_func(content)))
+        .where(table.c.id.in_(list(new_content)))
+        .values(content=case(new_content, value=table.c.id))
     )
-    logger.info("Done encrypting %s row %s.", table.name, row_id)
+    logger.info("Done encrypting %d %s rows.", len(rows), table.name)
+
+
+def _batches(iterable, size):
+    """
+    Split ``iterable`` into lists of at most ``size`` elements.
+    """
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
 
 
 def select_file_ids(db, user_id):
@@ -903,9 +1454,12 @@ def reencrypt_user_content(engine,
                            user_id,
                            old_decrypt_func,
                            new_encrypt_func,
-                           logger):
+                           logger,
+                           batch_size=100):
     """
     Re-encrypt all of the files and checkpoints for a single user.
+
+    Rows are re-encrypted in batches of ``batch_size``.
     """
     logger.info("Begin re-encryption for user %s", user_id)
     with engine.begin() as db:
@@ -924,22 +1478,26 @@ def reencrypt_user_content(engine,
         # which means that we would never update the content of that checkpoint
         # to the new encryption key.
         logger.info("Re-encrypting files for %s", user_id)
-        for (file_id,) in select_file_ids(db, user_id):
-            reencrypt_row_content(
+        file_ids = (file_id for (file_id,) in select_file_ids(db, user_id))
+        for batch in _batches(file_ids, batch_size):
+            reencrypt_rows_content(
                 db,
                 files,
-                file_id,
+                batch,
                 old_decrypt_func,
                 new_encrypt_func,
                 logger,
             )
 
         logger.info("Re-encrypting checkpoints for %s", user_id)
-        for (cp_id,) in select_remote_checkpoint_ids(db, user_id):
-            reencrypt_row_content(
+        cp_ids = (
+            cp_id for (cp_id,) in select_remote_checkpoint_ids(db, user_id)
+        )
+        for batch in _batches(cp_ids, batch_size):
+            reencrypt_rows_content(
                 db,
                 remote_checkpoints,
-                cp_id,
+                batch,
                 old_decrypt_func,
                 new_encrypt_func,
                 logger,
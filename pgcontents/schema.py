@@ -22,6 +22,7 @@ from sqlalchemy import (
     ForeignKey,
     ForeignKeyConstraint,
     func,
+    Index,
     Integer,
     LargeBinary,
     MetaData,
@@ -97,9 +98,11 @@ directories = Table(
         name='directories_endwith_slash',
     ),
     # Assert that the name of this directory has one more '/' than its parent.
+    # Slashes are counted with replace() rather than regexp_replace() because
+    # this check runs on every write.
     CheckConstraint(
-        "length(regexp_replace(name, '[^/]+', '', 'g')) - 1"
-        "= length(regexp_replace(parent_name, '[^/]+', '', 'g'))",
+        "length(name) - length(replace(name, '/', '')) - 1"
+        " = length(parent_name) - length(replace(parent_name, '/', ''))",
         name='directories_slash_count',
     ),
     # Assert that parent_user_id is NULL iff parent_name is NULL.  This should
@@ -115,6 +118,14 @@ directories = Table(
         name='directories_null_user_id_match',
     ),
 )
+# Subdirectory listings filter on (user_id, parent_name) and sort by name,
+# which the primary key on (user_id, name) can't serve.
+Index(
+    'ix_directories_user_id_parent_name_name',
+    directories.c.user_id,
+    directories.c.parent_name,
+    directories.c.name,
+)
 
 
 files = Table(
@@ -129,7 +140,7 @@ files = Table(
         nullable=False,
     ),
     Column('parent_name', FilePath, nullable=False),
-    Column('content', LargeBinary(100000), nullable=False),
+    Column('content', LargeBinary, nullable=False),
     Column(
         'created_at',
         DateTime,
@@ -162,6 +173,19 @@ remote_checkpoints = Table(
         nullable=False,
     ),
     Column('path', FilePath, nullable=False),
-    Column('content', LargeBinary(100000), nullable=False),
+    Column('content', LargeBinary, nullable=False),
     Column('last_modified', DateTime, default=func.now(), nullable=False),
 )
+Index(
+    'ix_remote_checkpoints_user_id_path_last_modified_id',
+    remote_checkpoints.c.user_id,
+    remote_checkpoints.c.path,
+    remote_checkpoints.c.last_modified,
+    remote_checkpoints.c.id,
+)
+Index(
+    'ix_remote_checkpoints_user_id_path_pattern',
+    remote_checkpoints.c.user_id,
+    remote_checkpoints.c.path,
+    postgresql_ops={'path': 'text_pattern_ops'},
+)
@@ -1,6 +1,8 @@
 """
 Tests for notebook encryption utilities.
 """
+from base64 import b64encode
+from copy import copy, deepcopy
 from unittest import TestCase
 
 from cryptography.fernet import Fernet
@@ -12,7 +14,9 @@ from ..crypto import (
     memoize_single_arg,
     NoEncryption,
     single_password_crypto_factory,
+    ZlibCompression,
 )
+from ..error import CorruptedFile, FileTooLarge
 
 
 class TestEncryption(TestCase):
@@ -81,3 +85,67 @@ class TestEncryption(TestCase):
 
         self.assertEqual(results, expected_results)
         self.assertEqual(full_calls, expected_full_calls)
+
+    def test_zlib_compression(self):
+        fernet = FernetEncryption(Fernet(Fernet.generate_key()))
+        crypto = ZlibCompression(fernet, max_size=100000, min_size=100)
+
+        small = b'eyJjZWxscyI6IFtdfQ=='
+        large = small * 1000
+
+        for data in (small, large):
+            self.assertEqual(crypto.decrypt(crypto.encrypt(data)), data)
+
+        # Large inputs should be compressed before encryption.
+        self.assertLess(
+            len(crypto.encrypt(large)),
+            len(fernet.encrypt(large)) // 10,
+        )
+        # Small inputs should be passed through to the wrapped crypto.
+        self.assertEqual(fernet.decrypt(crypto.encrypt(small)), small)
+
+        # Content written before compression was enabled should still be
+        # readable.
+        self.assertEqual(crypto.decrypt(fernet.encrypt(large)), large)
+
+        for copied in (copy(crypto), deepcopy(crypto)):
+            self.assertIsInstance(copied, ZlibCompression)
+            self.assertEqual(copied.decrypt(crypto.encrypt(large)), large)
+            self.assertEqual(crypto.decrypt(copied.encrypt(large)), large)
+
+        nocrypto = ZlibCompression(
+            NoEncryption(),
+            max_size=100000,
+            min_size=100,
+        )
+        self.assertEqual(nocrypto.decrypt(nocrypto.encrypt(large)), large)
+
+    def test_zlib_compression_limits(self):
+        crypto = ZlibCompression(NoEncryption(), max_size=1000, min_size=100)
+
+        # Inputs over max_size are rejected before compression.
+        crypto.encrypt(b'a' * 1000)
+        with self.assertRaises(FileTooLarge):
+            crypto.encrypt(b'a' * 1001)
+
+        # Payloads that would inflate past max_size are rejected rather than
+        # decompressed in full.
+        larger = ZlibCompression(NoEncryption(), max_size=10 ** 7)
+        bomb = larger.encrypt(b'\x00' * 10 ** 7)
+        self.assertLess(len(bomb), 20000)
+        with self.assertRaises(CorruptedFile):
+            crypto.decrypt(bomb)
+
+        # Uncompressed content stored by PostgresContentsManager is base64
+        # text, which never starts with the NUL-led prefix, so it's returned
+        # unchanged.
+        stored = b64encode(b'\x00zlib:' + b'a' * 2000)
+        self.assertEqual(crypto.decrypt(stored), stored)
+
+        # Content that does start with the prefix is always treated as
+        # compressed.
+        with self.assertRaises(CorruptedFile):
+            crypto.decrypt(b'\x00zlib:not compressed')
+
+        with self.assertRaises(ValueError):
+            ZlibCompression(NoEncryption(), max_size=0)
@@ -94,6 +94,20 @@ class PostgresTestCase(PostgresContentsManagerTestCase):
     def test_get_file_id(self):
         pass
 
+    # These tests call query functions directly against the
+    # PostgresContentsManager's engine, so there's nothing to dispatch.
+    def test_bulk_delete(self):
+        pass
+
+    def test_bulk_delete_not_empty(self):
+        pass
+
+    def test_bulk_save(self):
+        pass
+
+    def test_get_directory_subtree(self):
+        pass
+
     def set_pgmgr_attribute(self, name, value):
         setattr(self._pgmanager, name, value)
 
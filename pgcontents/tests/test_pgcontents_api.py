@@ -38,8 +38,9 @@ from ..pgmanager import (
 from ..checkpoints import PostgresCheckpoints
 from ..query import (
     create_directory,
-    delete_directory,
+    delete_directories,
     delete_file,
+    delete_files,
     dir_exists,
     file_exists,
     save_file,
@@ -346,10 +347,8 @@ class PostgresContentsAPITest(_APITestBase):
                 files.extend(fs)
 
             with self.engine.begin() as db:
-                for file_ in files:
-                    delete_file(db, self.user_id, file_)
-                for dir_ in reversed(dirs):
-                    delete_directory(db, self.user_id, dir_)
+                delete_files(db, self.user_id, files)
+                delete_directories(db, self.user_id, dirs)
 
     def delete_file(self, api_path):
         if self.isfile(api_path):
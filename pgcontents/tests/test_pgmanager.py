@@ -33,6 +33,16 @@ from .utils import (
     remigrate_test_schema,
 )
 from ..crypto import FernetEncryption
+from ..error import DirectoryNotEmpty
+from ..query import (
+    delete_directories,
+    delete_files,
+    dir_exists,
+    ensure_directories,
+    get_directory,
+    get_directory_subtree,
+    save_files,
+)
 from ..utils.sync import walk_files_with_content
 
 setup_module = remigrate_test_schema
@@ -203,6 +213,26 @@ class PostgresContentsManagerTestCase(TestContentsManager):
         cm.rename(path, updated_path)
         self.assertEqual(id_, cm.get_file_id(updated_path))
 
+    def test_save_returns_saved_model(self):
+        cm = self.contents_manager
+
+        nb, name, path = self.new_notebook()
+        model = cm.get(path)
+        self.add_code_cell(model['content'])
+        saved = cm.save(model, path)
+        self.assertEqual(saved, cm.get(path, content=False))
+
+        file_path = 'file.txt'
+        saved = cm.save(
+            model={
+                'content': 'some text',
+                'format': 'text',
+                'type': 'file',
+            },
+            path=file_path,
+        )
+        self.assertEqual(saved, cm.get(file_path, content=False))
+
     def test_rename_file(self):
         cm = self.contents_manager
         nb, nb_name, nb_path = self.new_notebook()
@@ -389,6 +419,144 @@ class PostgresContentsManagerTestCase(TestContentsManager):
         )
         assert len(empty_dir_model['content']) == 0
 
+    def test_move_directory_checkpoints(self):
+        cm = self.contents_manager
+        for dir_ in ['foo', 'foobar']:
+            self.make_populated_dir(dir_)
+            cm.create_checkpoint('/'.join([dir_, 'nb.ipynb']))
+
+        cm.rename('foo', 'baz')
+
+        self.assertEqual(len(cm.list_checkpoints('baz/nb.ipynb')), 1)
+        self.assertEqual(len(cm.list_checkpoints('foo/nb.ipynb')), 0)
+
+        # Checkpoints for paths that merely start with the same characters
+        # as the moved directory should be left alone.
+        self.assertEqual(len(cm.list_checkpoints('foobar/nb.ipynb')), 1)
+        self.assertEqual(len(cm.list_checkpoints('bazbar/nb.ipynb')), 0)
+
+    def test_bulk_delete(self):
+        cm = self.contents_manager
+        self.make_populated_dir('foo')
+        self.make_populated_dir('foo/bar')
+
+        # Directories that still contain files can't be deleted.
+        with self.assertRaises(DirectoryNotEmpty):
+            with cm.engine.begin() as db:
+                delete_directories(db, cm.user_id, ['foo', 'foo/bar'])
+
+        with cm.engine.begin() as db:
+            deleted = delete_files(
+                db,
+                cm.user_id,
+                [
+                    'foo/nb.ipynb',
+                    'foo/file.txt',
+                    'foo/bar/nb.ipynb',
+                    'foo/bar/file.txt',
+                    'foo/nonexistent.txt',
+                ],
+            )
+            self.assertEqual(deleted, 4)
+
+            deleted = delete_directories(db, cm.user_id, ['foo', 'foo/bar'])
+            self.assertEqual(deleted, 2)
+
+        for path in ['foo', 'foo/bar', 'foo/nb.ipynb', 'foo/bar/file.txt']:
+            with assertRaisesHTTPError(self, 404):
+                cm.get(path)
+
+    def test_bulk_delete_not_empty(self):
+        cm = self.contents_manager
+        self.make_populated_dir('foo')
+        self.make_populated_dir('foo/bar')
+        self.make_dir('foo/baz')
+
+        # The error names the first directory that can't be deleted.
+        with cm.engine.begin() as db:
+            with self.assertRaises(DirectoryNotEmpty) as e:
+                delete_directories(db, cm.user_id, ['foo/baz', 'foo/bar'])
+            self.assertEqual(e.exception.args, ('foo/bar',))
+
+            # The failed delete is rolled back, but the transaction is still
+            # usable.
+            self.assertTrue(dir_exists(db, cm.user_id, 'foo/baz'))
+
+        with cm.engine.begin() as db:
+            delete_files(
+                db,
+                cm.user_id,
+                ['foo/nb.ipynb', 'foo/file.txt'],
+            )
+
+            # foo has no files left, but foo/bar isn't being deleted with it.
+            with self.assertRaises(DirectoryNotEmpty) as e:
+                delete_directories(db, cm.user_id, ['foo', 'foo/baz'])
+            self.assertEqual(e.exception.args, ('foo',))
+
+    def test_bulk_save(self):
+        cm = self.contents_manager
+        self.make_dir('foo')
+
+        with cm.engine.begin() as db:
+            # Parents may be created in the same statement as their children,
+            # and directories that already exist are skipped.
+            created = ensure_directories(
+                db,
+                cm.user_id,
+                ['foo', 'foo/bar/baz', 'foo/bar', 'foo/bar'],
+            )
+            self.assertEqual(created, 2)
+
+            saved = save_files(
+                db,
+                cm.user_id,
+                [
+                    ('foo/a.txt', b64encode(b'a')),
+                    ('foo/bar/b.txt', b64encode(b'b')),
+                    ('foo/a.txt', b64encode(b'c')),
+                ],
+                cm.crypto.encrypt,
+                cm.max_file_size_bytes,
+            )
+            self.assertEqual(
+                sorted((f['parent_name'], f['name']) for f in saved),
+                [('/foo/', 'a.txt'), ('/foo/bar/', 'b.txt')],
+            )
+
+        self.assertEqual(cm.get('foo/bar/baz')['type'], 'directory')
+        self.assertEqual(cm.get('foo/a.txt')['content'], 'c')
+        self.assertEqual(cm.get('foo/bar/b.txt')['content'], 'b')
+
+    def test_get_directory_subtree(self):
+        cm = self.contents_manager
+        for dir_ in ['foo', 'foo/bar', 'foo/bar/baz', 'foo_bar', 'bar']:
+            self.make_populated_dir(dir_)
+
+        def sort_records(record):
+            return {
+                'name': record['name'],
+                'files': sorted(record['files'], key=lambda f: f['name']),
+                'subdirs': sorted(record['subdirs'], key=lambda d: d['name']),
+            }
+
+        with cm.engine.begin() as db:
+            tree = get_directory_subtree(db, cm.user_id, 'foo')
+            self.assertEqual(
+                sorted(tree),
+                ['/foo/', '/foo/bar/', '/foo/bar/baz/'],
+            )
+            for db_dirname, record in tree.items():
+                self.assertEqual(
+                    sort_records(record),
+                    sort_records(
+                        get_directory(db, cm.user_id, db_dirname, True)
+                    ),
+                )
+
+            root_tree = get_directory_subtree(db, cm.user_id, '')
+            self.assertEqual(len(root_tree), 6)
+
     def test_max_file_size(self):
 
         cm = self.contents_manager
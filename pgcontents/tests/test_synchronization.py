@@ -4,6 +4,8 @@ Tests for synchronization tools.
 from __future__ import unicode_literals
 from base64 import b64encode
 from logging import Logger
+from threading import Lock
+from time import sleep
 from unittest import TestCase
 
 from cryptography.fernet import Fernet
@@ -16,7 +18,7 @@ from pgcontents.crypto import (
     single_password_crypto_factory,
 )
 from pgcontents.query import generate_files, generate_checkpoints
-from pgcontents.utils.ipycompat import new_markdown_cell
+from pgcontents.utils.ipycompat import new_markdown_cell, reads
 
 from .utils import (
     assertRaisesHTTPError,
@@ -26,6 +28,8 @@ from .utils import (
     TEST_DB_URL,
 )
 from ..utils.sync import (
+    _for_each_user,
+    create_reencryption_engine,
     reencrypt_all_users,
     unencrypt_all_users,
 )
@@ -145,7 +149,8 @@ class TestReEncryption(TestCase):
                 new.restore_checkpoint(new_cp['id'], path)
                 check_path_content(path, new, updated_content)
 
-        engine = create_engine(db_url)
+        engine = create_reencryption_engine(db_url, max_workers=2)
+        self.addCleanup(engine.dispose)
         logger = Logger('Reencryption Testing')
 
         no_crypto_factory = {user_id: no_crypto}.__getitem__
@@ -168,6 +173,7 @@ class TestReEncryption(TestCase):
                 crypto1_factory,
                 crypto2_factory,
                 logger,
+                max_workers=2,
             )
             check_reencryption(manager1, manager2)
 
@@ -189,6 +195,34 @@ class TestReEncryption(TestCase):
         check_reencryption(manager2, no_crypto_manager)
 
 
+class TestForEachUser(TestCase):
+
+    def check_stops_after_failure(self, max_workers):
+        user_ids = ['user%d' % i for i in range(100)]
+        called = []
+        lock = Lock()
+
+        def f(user_id):
+            with lock:
+                called.append(user_id)
+            if user_id == 'user0':
+                raise ValueError(user_id)
+            sleep(0.01)
+
+        with self.assertRaises(ValueError):
+            _for_each_user(f, user_ids, max_workers)
+
+        # Once the failure is seen, no further users should be started.
+        self.assertIn('user0', called)
+        self.assertLess(len(called), len(user_ids) // 2)
+
+    def test_serial_stops_after_failure(self):
+        self.check_stops_after_failure(max_workers=1)
+
+    def test_threaded_stops_after_failure(self):
+        self.check_stops_after_failure(max_workers=2)
+
+
 class TestGenerateNotebooks(TestCase):
 
     def setUp(self):
@@ -340,6 +374,32 @@ class TestGenerateNotebooks(TestCase):
             expect_warning=False,
         )
 
+    def test_generate_files_unparsed(self):
+        """
+        Check that `generate_files` with parse=False yields the JSON of the
+        same notebooks it yields when parsing.
+        """
+        user_ids = ['test_generate_files_unparsed0',
+                    'test_generate_files_unparsed1']
+        (managers, paths) = self.populate_users(user_ids)
+        self.addCleanup(self.cleanup_pgcontents_managers, managers.values())
+
+        parsed = list(generate_files(self.engine, self.crypto_factory))
+        unparsed = list(
+            generate_files(self.engine, self.crypto_factory, parse=False)
+        )
+
+        self.assertEqual(len(parsed), len(paths))
+        self.assertEqual(len(unparsed), len(paths))
+        for parsed_result, unparsed_result in zip(parsed, unparsed):
+            content = unparsed_result.pop('content')
+            self.assertIsInstance(content, bytes)
+            self.assertEqual(
+                reads(content.decode('utf-8'), as_version=4),
+                parsed_result.pop('content'),
+            )
+            self.assertEqual(unparsed_result, parsed_result)
+
     def test_generate_checkpoints(self):
         """
         Create checkpoints in three stages; try fetching them with
@@ -5,6 +5,9 @@ from __future__ import (
     print_function,
     unicode_literals,
 )
+from multiprocessing.pool import ThreadPool
+
+from sqlalchemy import create_engine
 
 from ..checkpoints import PostgresCheckpoints
 from ..crypto import FallbackCrypto
@@ -85,6 +88,25 @@ def walk_files_with_content(mgr):
             yield mgr.get(f, content=True)
 
 
+def create_reencryption_engine(db_url, max_workers=1):
+    """
+    Create an engine for use with ``reencrypt_all_users`` or
+    ``unencrypt_all_users``.
+
+    The engine's pool holds one connection for each of ``max_workers``.
+    Connections are checked before use and recycled after five minutes,
+    since re-encrypting a large database can run long enough for idle
+    connections to be dropped by the server.
+    """
+    return create_engine(
+        db_url,
+        pool_size=max_workers,
+        max_overflow=0,
+        pool_pre_ping=True,
+        pool_recycle=300,
+    )
+
+
 def all_user_ids(engine):
     """
     Get a list of user_ids from an engine.
@@ -93,10 +115,37 @@ def all_user_ids(engine):
         return [row[0] for row in list_users(db)]
 
 
+def _for_each_user(f, user_ids, max_workers):
+    """
+    Call ``f`` on each entry in ``user_ids``, using up to ``max_workers``
+    threads.
+
+    The first exception raised by ``f`` is re-raised in the calling thread.
+    Users that have not been started yet are skipped, but calls that are
+    already running in other threads are allowed to finish.
+    """
+    if max_workers == 1:
+        for user_id in user_ids:
+            f(user_id)
+        return
+
+    pool = ThreadPool(max_workers)
+    try:
+        for _ in pool.imap_unordered(f, user_ids):
+            pass
+    except BaseException:
+        pool.terminate()
+        pool.join()
+        raise
+    pool.close()
+    pool.join()
+
+
 def reencrypt_all_users(engine,
                         old_crypto_factory,
                         new_crypto_factory,
-                        logger):
+                        logger,
+                        max_workers=1):
     """
     Re-encrypt data for all users.
 
@@ -130,6 +179,11 @@ def reencrypt_all_users(engine,
         ``unencrypt_all_users`` if you want to unencrypt a database.
     logger : logging.Logger, optional
         A logger to user during re-encryption.
+    max_workers : int, optional
+        Number of users to re-encrypt concurrently.  Each user is
+        re-encrypted in its own transaction, so ``engine``'s connection pool
+        should allow at least this many connections.  See
+        ``create_reencryption_engine``.
 
     See Also
     --------
@@ -137,7 +191,8 @@ def reencrypt_all_users(engine,
     unencrypt_all_users
     """
     logger.info("Beginning re-encryption for all users.")
-    for user_id in all_user_ids(engine):
+
+    def reencrypt(user_id):
         reencrypt_single_user(
             engine,
             user_id,
@@ -145,6 +200,8 @@ def reencrypt_all_users(engine,
             new_crypto=new_crypto_factory(user_id),
             logger=logger,
         )
+
+    _for_each_user(reencrypt, all_user_ids(engine), max_workers)
     logger.info("Finished re-encryption for all users.")
 
 
@@ -164,7 +221,7 @@ def reencrypt_single_user(engine, user_id, old_crypto, new_crypto, logger):
     )
 
 
-def unencrypt_all_users(engine, old_crypto_factory, logger):
+def unencrypt_all_users(engine, old_crypto_factory, logger, max_workers=1):
     """
     Unencrypt data for all users.
 
@@ -178,15 +235,22 @@ def unencrypt_all_users(engine, old_crypto_factory, logger):
         decryption of existing database content.
     logger : logging.Logger, optional
         A logger to user during re-encryption.
+    max_workers : int, optional
+        Number of users to unencrypt concurrently.  Each user is unencrypted
+        in its own transaction, so ``engine``'s connection pool should allow
+        at least this many connections.  See ``create_reencryption_engine``.
     """
     logger.info("Beginning re-encryption for all users.")
-    for user_id in all_user_ids(engine):
+
+    def unencrypt(user_id):
         unencrypt_single_user(
             engine=engine,
             user_id=user_id,
             old_crypto=old_crypto_factory(user_id),
             logger=logger,
         )
+
+    _for_each_user(unencrypt, all_user_ids(engine), max_workers)
     logger.info("Finished re-encryption for all users.")
 
 
@@ -43,7 +43,7 @@ def main():
             'Topic :: Database',
         ],
         install_requires=[
-            'SQLAlchemy>=1.0.5',
+            'SQLAlchemy>=1.2',
             'alembic>=0.7.6',
             'click>=3.3',
             'cryptography>=1.4',